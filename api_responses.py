@@ -0,0 +1,63 @@
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from starlette.middleware.gzip import GZipMiddleware
+from hashlib import blake2b
+import os
+import orjson
+
+
+# Responses smaller than this are sent as is, compressing them costs more
+# than it saves
+GZIP_MIN_SIZE = int(os.environ.get("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+
+
+def json_dumps(content) -> bytes:
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def json_loads(data):
+    """Parses JSON; errors are raised as json.JSONDecodeError subclasses."""
+    return orjson.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson instead of the stdlib encoder."""
+
+    def render(self, content) -> bytes:
+        return json_dumps(content)
+
+
+def compute_etag(body: bytes) -> str:
+    # Weak, since the gzip middleware may change the encoded bytes
+    return f'W/"{blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque
+               for tag in if_none_match.split(","))
+
+
+def conditional_response(request: Request, content):
+    """
+    Returns content as JSON with an ETag, or an empty 304 when the client
+    already holds that version (If-None-Match).
+    """
+    response = FastJSONResponse(status_code=200, content=content)
+    etag = compute_etag(response.body)
+    # Clients may cache but must revalidate, the data is per user
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
+
+
+def add_response_compression(app: FastAPI):
+    app.add_middleware(
+        GZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=GZIP_LEVEL)
@@ -1,37 +1,76 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends
-from fastapi.responses import JSONResponse
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, File, UploadFile, Form, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+import asyncio
+import os
 import uvicorn
 from typing import List
 import uuid
 from db import get_db  # type: ignore
+from connections import get_mongo_client, get_redis_client, close_connections
 from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
 from auth import add_auth_routes, get_current_user
-from helpers import extract_text_from_file, get_llm_response, parse_llm_response, check_rate_limit_demo, get_client_identifier, MAX_REQUESTS, MAX_REQUESTS_FREE, check_rate_limit_free_users
+from metrics import add_metrics_routes, timed, STARTUP_SECONDS
+from profiler import add_profiler_routes
+from uploads import add_upload_limits
+from api_responses import FastJSONResponse, add_response_compression, conditional_response
+from health import add_health_routes, create_indexes, warm_up
+from skills import SKILL_MATCHER_MODE, apply_skill_match, get_skill_matcher, match_skills
+from dedup import DEDUP_ENABLED, DuplicateIndex, find_history_duplicate, jd_fingerprint, lsh_bands, minhash_signature, record_duplicate
+from jobs import jd_preview, record_job_candidates
+from lifecycle import LIFECYCLE_ENABLED, find_recent_uploads, find_upload, find_uploads, run_compactor
+from helpers import extract_text_from_file, extract_document, get_llm_response, parse_llm_response, is_llm_parse_error, check_rate_limit_demo, get_client_identifier, MAX_REQUESTS, MAX_REQUESTS_FREE, check_rate_limit_free_users
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Initialize FastAPI app
-app = FastAPI()
+# Import heavy libraries and open connections in the background at startup
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Creates the database and cache pools for the app's lifetime."""
+    try:
+        get_mongo_client()
+        get_redis_client()
+    except Exception as e:
+        # Reported by /readyz instead of crashing the process
+        print(f"Client setup error: {str(e)}")
+
+    # Indexes are created once per process, off the request path
+    index_task = asyncio.create_task(create_indexes())
 
-# Add CORS middleware to allow requests from your frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allows all origins in development
-    allow_credentials=True,
-    allow_methods=["*"],  # Allows all methods
-    allow_headers=["*"],  # Allows all headers
-)
+    warmup_task = None
+    if WARMUP_ON_STARTUP:
+        app.state.warmup = "pending"
+        warmup_task = asyncio.create_task(warm_up(app))
+    # Move old uploads to the compressed archive in the background
+    compactor_task = None
+    if LIFECYCLE_ENABLED:
+        compactor_task = asyncio.create_task(run_compactor(get_db, after=index_task))
+    STARTUP_SECONDS.set("startup", value=time.perf_counter() - _import_started)
 
+    yield
 
-# Adding auth routes
-add_auth_routes(app)
+    index_task.cancel()
+    if warmup_task is not None:
+        warmup_task.cancel()
+    if compactor_task is not None:
+        compactor_task.cancel()
+    await close_connections()
 
-# API Routes
 
+# API routes, mounted by create_app()
+router = APIRouter()
 
-@app.post("/api/employee", response_class=JSONResponse)
+
+@router.post("/api/employee", response_class=FastJSONResponse)
 async def process_employee(
     file: UploadFile = File(...),
     jd_text: str = Form(None),
@@ -58,7 +97,8 @@ async def process_employee(
         db = get_db()
 
         # Extract text from uploaded CV
-        cv_text = extract_text_from_file(file)
+        cv_document = extract_document(file)
+        cv_text = cv_document["text"]
 
         # Extract text from JD file if provided
         jd_text_final = jd_text
@@ -91,6 +131,12 @@ JD:
         llm_response = get_llm_response(prompt)
         parsed_llm_response = parse_llm_response(llm_response)
 
+        # Add the local, deterministic skill analysis
+        if SKILL_MATCHER_MODE != "off":
+            required_skills = get_skill_matcher().extract(jd_text_final)
+            parsed_llm_response = apply_skill_match(
+                parsed_llm_response, match_skills(required_skills, cv_text))
+
         # Store data in MongoDB
         record = {
             "employer_id": str(uuid.uuid4()),
@@ -98,13 +144,16 @@ JD:
             "jd_filename": jd_file.filename if jd_file else None,
             "jd_text": jd_text_final,
             "cv_text": cv_text,
+            "cv_pages_skipped": cv_document["pages_skipped"],
+            "cv_extraction_tier": cv_document["tier"],
             "analysis_result": parsed_llm_response,
             "user_id": str(current_user.get("_id", "")),
             "created_at": datetime.now()
         }
 
         try:
-            await db.employee_uploads.insert_one(record)
+            with timed("mongo_insert"):
+                await db.employee_uploads.insert_one(record)
         except Exception as e:
             # Log the database error but continue to return the analysis
             print(f"Database error: {str(e)}")
@@ -117,11 +166,14 @@ JD:
             "reset_after_hours": 24
         }
 
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=200,
             content=response_content
         )
 
+    except HTTPException:
+        # Keep upload rejections (400/413) instead of turning them into 500s
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -129,7 +181,7 @@ JD:
         )
 
 
-@app.post("/api/employer", response_class=JSONResponse)
+@router.post("/api/employer", response_class=FastJSONResponse)
 async def process_employer(
     jd_text: str = Form(None),
     jd_file: UploadFile = File(None),
@@ -162,15 +214,49 @@ async def process_employer(
 
         # Process candidates
         candidate_results = []
+        rejected_candidates = []
         employer_id = str(uuid.uuid4())  # Same employer ID for all candidates
+        user_id = str(current_user.get("_id", ""))
+
+        # Skills required by the JD are extracted once for the whole batch
+        required_skills = None
+        if SKILL_MATCHER_MODE != "off":
+            required_skills = get_skill_matcher().extract(jd_text_final)
+
+        # Near-duplicate CVs are scored once and the result reused
+        batch_duplicates = DuplicateIndex()
+        jd_hash = jd_fingerprint(jd_text_final)
+
+        # Scores of the stored candidates, summarised in employer_jobs
+        stored_scores = []
+        job_created_at = datetime.now()
 
         for cv_file in candidates:
             try:
                 # Extract CV text
-                cv_text = extract_text_from_file(cv_file)
-
-                # Construct LLM prompt
-                prompt = f"""
+                cv_document = extract_document(cv_file)
+                cv_text = cv_document["text"]
+
+                # Look for an already scored near-duplicate
+                signature = minhash_signature(cv_text) if DEDUP_ENABLED else None
+                duplicate, duplicate_source = None, None
+                if signature is not None:
+                    duplicate = batch_duplicates.find(signature)
+                    duplicate_source = "batch"
+                    if duplicate is None:
+                        try:
+                            duplicate = await find_history_duplicate(
+                                db, user_id, jd_hash, signature)
+                            duplicate_source = "history"
+                        except Exception as e:
+                            print(f"Database error checking duplicates for {cv_file.filename}: {str(e)}")
+
+                if duplicate is not None:
+                    record_duplicate(duplicate_source)
+                    parsed_response = dict(duplicate["analysis_result"])
+                else:
+                    # Construct LLM prompt
+                    prompt = f"""
 You are an expert HR consultant with extensive experience evaluating resumes in both technical (e.g., software engineering, data science) and non-technical (e.g., accounting, business analysis) domains. Please analyze the following candidate's CV and job description (JD) and complete these tasks:
 
 1. Compare the CV with the JD and determine how well the candidate meets the job requirements.
@@ -191,15 +277,36 @@ JD:
 {jd_text_final}
 """
 
-                # Generate LLM response
-                llm_response = get_llm_response(prompt)
-                parsed_response = parse_llm_response(llm_response)
+                    # Generate LLM response
+                    llm_response = get_llm_response(prompt)
+                    parsed_response = parse_llm_response(llm_response)
+
+                    # A failed parse must not be reused for near-duplicates,
+                    # so it is neither indexed nor stored with a signature
+                    if is_llm_parse_error(parsed_response):
+                        signature = None
+
+                    if signature is not None:
+                        batch_duplicates.add(signature, {
+                            "cv_filename": cv_file.filename,
+                            "analysis_result": parsed_response
+                        })
+
+                # Add the local, deterministic skill analysis
+                if required_skills is not None:
+                    parsed_response = apply_skill_match(
+                        parsed_response, match_skills(required_skills, cv_text))
 
                 # Add to results
                 candidate_result = {
                     "filename": cv_file.filename,
                     **parsed_response
                 }
+                if duplicate is not None:
+                    candidate_result["Duplicate Of"] = duplicate["cv_filename"]
+                    candidate_result["Duplicate Source"] = duplicate_source
+                    if duplicate_source == "history":
+                        candidate_result["Duplicate Job"] = duplicate["employer_id"]
                 candidate_results.append(candidate_result)
 
                 # Store in MongoDB
@@ -207,44 +314,74 @@ JD:
                     "employer_id": employer_id,
                     "cv_filename": cv_file.filename,
                     "jd_text": jd_text_final,
+                    "jd_hash": jd_hash,
                     "cv_text": cv_text,
+                    "cv_pages_skipped": cv_document["pages_skipped"],
+                    "cv_extraction_tier": cv_document["tier"],
                     "analysis_result": parsed_response,
-                    "user_id": str(current_user.get("_id", "")),
+                    "user_id": user_id,
                     "created_at": datetime.now()
                 }
+                if signature is not None:
+                    record["cv_minhash"] = signature
+                    record["cv_lsh_bands"] = lsh_bands(signature)
+                if duplicate is not None:
+                    record["duplicate_of"] = duplicate["cv_filename"]
 
                 try:
-                    await db.employer_uploads.insert_one(record)
+                    with timed("mongo_insert"):
+                        await db.employer_uploads.insert_one(record)
+                    stored_scores.append(parsed_response.get("JD-Match"))
                 except Exception as e:
                     # Log the database error but continue processing
                     print(f"Database error for {cv_file.filename}: {str(e)}")
 
+            except HTTPException as e:
+                # Report rejected uploads (400/413) instead of dropping them
+                rejected_candidates.append({
+                    "filename": cv_file.filename,
+                    "status_code": e.status_code,
+                    "detail": e.detail
+                })
+                continue
             except Exception as e:
                 # Log the error but continue with other candidates
                 print(f"Error processing {cv_file.filename}: {str(e)}")
                 continue
 
-        # Sort candidates by match score
+        if stored_scores:
+            try:
+                await record_job_candidates(
+                    db, user_id, employer_id, jd_text_final, stored_scores, job_created_at)
+            except Exception as e:
+                print(f"Database error updating job summary: {str(e)}")
+
+        # Sort candidates by match score, ties broken by skill coverage
         candidate_results.sort(
-            key=lambda x: (-x["JD-Match"], len(x["Missing Skills"]))
+            key=lambda x: (-x["JD-Match"], -(x.get("Skill Coverage") or 0),
+                           len(x["Missing Skills"]))
         )
 
         # Assign positions
         for index, result in enumerate(candidate_results):
             result["Position"] = index + 1
 
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=200,
             content={
                 "employer_id": employer_id,
                 "candidates_count": len(candidate_results),
                 "candidates_results": candidate_results,
+                "rejected_candidates": rejected_candidates,
                 "remaining_requests": remaining_requests,
                 "maximum_requests": MAX_REQUESTS_FREE,
                 "reset_after_hours": 24
             }
         )
 
+    except HTTPException:
+        # Keep upload rejections (400/413) instead of turning them into 500s
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -252,7 +389,7 @@ JD:
         )
 
 
-@app.post("/api/demo", response_class=JSONResponse)
+@router.post("/api/demo", response_class=FastJSONResponse)
 async def demo(
     file: UploadFile = File(...),
     jd_file: UploadFile = File(None),
@@ -305,6 +442,12 @@ JD:
         llm_response = get_llm_response(prompt)
         parsed_llm_response = parse_llm_response(llm_response)
 
+        # Add the local, deterministic skill analysis
+        if SKILL_MATCHER_MODE != "off":
+            required_skills = get_skill_matcher().extract(jd_text_final)
+            parsed_llm_response = apply_skill_match(
+                parsed_llm_response, match_skills(required_skills, cv_text))
+
         # Add rate limit information to response
         response_content = parsed_llm_response.copy()
         response_content["rate_limit"] = {
@@ -313,11 +456,14 @@ JD:
             "reset_after_hours": 24
         }
 
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=200,
             content=response_content
         )
 
+    except HTTPException:
+        # Keep upload rejections (400/413) instead of turning them into 500s
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -327,8 +473,8 @@ JD:
 
 # Profile API endpoints
 
-@app.get("/api/profile", response_class=JSONResponse)
-async def get_user_profile(current_user: dict = Depends(get_current_user)):
+@router.get("/api/profile", response_class=FastJSONResponse)
+async def get_user_profile(request: Request, current_user: dict = Depends(get_current_user)):
     """
     Get the profile details of the currently authenticated user (employee or employer).
     Returns different fields based on the user type.
@@ -338,9 +484,9 @@ async def get_user_profile(current_user: dict = Depends(get_current_user)):
         user_type = current_user.get("user_type")
 
         if user_type == "employee":
-            return JSONResponse(
-                status_code=200,
-                content={
+            return conditional_response(
+                request,
+                {
                     "user_id": str(current_user.get("_id", "")),
                     "full_name": current_user.get("full_name", ""),
                     "email": current_user.get("email", ""),
@@ -350,9 +496,9 @@ async def get_user_profile(current_user: dict = Depends(get_current_user)):
                 }
             )
         elif user_type == "employer":
-            return JSONResponse(
-                status_code=200,
-                content={
+            return conditional_response(
+                request,
+                {
                     "user_id": str(current_user.get("_id", "")),
                     "company_name": current_user.get("company_name", ""),
                     "email": current_user.get("email", ""),
@@ -369,8 +515,8 @@ async def get_user_profile(current_user: dict = Depends(get_current_user)):
             status_code=500, detail=f"Error retrieving profile: {str(e)}")
 
 
-@app.get("/api/profile/history", response_class=JSONResponse)
-async def get_user_history(current_user: dict = Depends(get_current_user)):
+@router.get("/api/profile/history", response_class=FastJSONResponse)
+async def get_user_history(request: Request, current_user: dict = Depends(get_current_user)):
     """
     Get the upload history for the currently authenticated user.
     Returns different collections based on user type.
@@ -381,10 +527,10 @@ async def get_user_history(current_user: dict = Depends(get_current_user)):
         user_id = str(current_user.get("_id", ""))
 
         if user_type == "employee":
-            # Get employee's CV upload history
-            uploads = await db.employee_uploads.find(
-                {"user_id": user_id}
-            ).sort("created_at", -1).to_list(length=20)
+            # Get employee's CV upload history, older uploads come from the archive
+            with timed("mongo_query"):
+                uploads = await find_recent_uploads(
+                    db, "employee_uploads", {"user_id": user_id}, limit=20)
 
             # Convert ObjectId to string for JSON serialization
             formatted_uploads = []
@@ -392,14 +538,14 @@ async def get_user_history(current_user: dict = Depends(get_current_user)):
                 formatted_uploads.append({
                     "_id": str(upload["_id"]),
                     "cv_filename": upload.get("cv_filename", ""),
-                    "jd_text": upload.get("jd_text", "")[:100] + "..." if len(upload.get("jd_text", "")) > 100 else upload.get("jd_text", ""),
+                    "jd_text": upload.get("jd_preview") or jd_preview(upload.get("jd_text")),
                     "analysis_result": upload.get("analysis_result", {}),
                     "created_at": upload["created_at"].isoformat()
                 })
 
-            return JSONResponse(
-                status_code=200,
-                content={
+            return conditional_response(
+                request,
+                {
                     "user_id": user_id,
                     "user_type": "employee",
                     "history": formatted_uploads
@@ -407,32 +553,26 @@ async def get_user_history(current_user: dict = Depends(get_current_user)):
             )
 
         elif user_type == "employer":
-            # Get unique employer_ids created by this user
-            employer_jobs = await db.employer_uploads.aggregate([
-                {"$match": {"user_id": user_id}},
-                {"$group": {
-                    "_id": "$employer_id",
-                    "jd_text": {"$first": "$jd_text"},
-                    "created_at": {"$first": "$created_at"},
-                    "count": {"$sum": 1}
-                }},
-                {"$sort": {"created_at": -1}},
-                {"$limit": 20}
-            ]).to_list(length=20)
+            # Read the per-job summaries, newest first
+            with timed("mongo_query"):
+                employer_jobs = await db.employer_jobs.find(
+                    {"user_id": user_id}
+                ).sort("created_at", -1).to_list(length=20)
 
             # Format the results
             formatted_jobs = []
             for job in employer_jobs:
                 formatted_jobs.append({
                     "employer_id": job["_id"],
-                    "jd_text": job.get("jd_text", "")[:100] + "..." if len(job.get("jd_text", "")) > 100 else job.get("jd_text", ""),
-                    "candidate_count": job["count"],
+                    "jd_text": job.get("jd_preview", ""),
+                    "candidate_count": job.get("candidate_count", 0),
+                    "top_score": job.get("top_score"),
                     "created_at": job["created_at"].isoformat()
                 })
 
-            return JSONResponse(
-                status_code=200,
-                content={
+            return conditional_response(
+                request,
+                {
                     "user_id": user_id,
                     "user_type": "employer",
                     "history": formatted_jobs
@@ -447,5 +587,123 @@ async def get_user_history(current_user: dict = Depends(get_current_user)):
             status_code=500, detail=f"Error retrieving history: {str(e)}")
 
 
+@router.get("/api/profile/history/{upload_id}", response_class=FastJSONResponse)
+async def get_upload_detail(upload_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Get one CV upload of the authenticated employee, including the CV and
+    JD text. Archived uploads are decompressed on demand.
+    """
+    if current_user.get("user_type") != "employee":
+        raise HTTPException(status_code=400, detail="Invalid user type")
+    try:
+        upload_object_id = ObjectId(upload_id)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    try:
+        db = get_db()
+        user_id = str(current_user.get("_id", ""))
+        with timed("mongo_query"):
+            upload = await find_upload(
+                db, "employee_uploads", {"_id": upload_object_id, "user_id": user_id})
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error retrieving upload: {str(e)}")
+
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    return FastJSONResponse(
+        status_code=200,
+        content={
+            "_id": str(upload["_id"]),
+            "cv_filename": upload.get("cv_filename", ""),
+            "jd_filename": upload.get("jd_filename"),
+            "jd_text": upload.get("jd_text", ""),
+            "cv_text": upload.get("cv_text", ""),
+            "analysis_result": upload.get("analysis_result", {}),
+            "created_at": upload["created_at"].isoformat(),
+            "archived": "archived_at" in upload
+        }
+    )
+
+
+@router.get("/api/profile/history/jobs/{employer_id}", response_class=FastJSONResponse)
+async def get_job_detail(employer_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Get the candidates of one job of the authenticated employer, best
+    match first. Archived candidates are read from the archive.
+    """
+    if current_user.get("user_type") != "employer":
+        raise HTTPException(status_code=400, detail="Invalid user type")
+
+    try:
+        db = get_db()
+        query = {"user_id": str(current_user.get("_id", "")), "employer_id": employer_id}
+        with timed("mongo_query"):
+            candidates = await find_uploads(db, "employer_uploads", query, limit=1000)
+            first_upload = await find_upload(db, "employer_uploads", query) if candidates else None
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error retrieving job: {str(e)}")
+
+    if not candidates:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    candidates.sort(key=lambda x: -(x.get("analysis_result", {}).get("JD-Match") or 0))
+    return FastJSONResponse(
+        status_code=200,
+        content={
+            "employer_id": employer_id,
+            "jd_text": first_upload.get("jd_text", "") if first_upload else "",
+            "candidates": [{
+                "cv_filename": candidate.get("cv_filename", ""),
+                "analysis_result": candidate.get("analysis_result", {}),
+                "duplicate_of": candidate.get("duplicate_of"),
+                "created_at": candidate["created_at"].isoformat(),
+                "archived": "archived_at" in candidate
+            } for candidate in candidates]
+        }
+    )
+
+
+def create_app():
+    """Builds the FastAPI application."""
+    app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+    # Add CORS middleware to allow requests from your frontend
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Allows all origins in development
+        allow_credentials=True,
+        allow_methods=["*"],  # Allows all methods
+        allow_headers=["*"],  # Allows all headers
+    )
+
+    # Compress larger responses (gzip above GZIP_MIN_SIZE bytes)
+    add_response_compression(app)
+
+    # Reject oversized request bodies while they are being received
+    add_upload_limits(app)
+
+    # Adding auth routes
+    add_auth_routes(app)
+
+    # Adding metrics middleware and /metrics endpoint
+    add_metrics_routes(app)
+
+    # Adding admin-only profiling endpoints (enabled by PROFILER_TOKEN)
+    add_profiler_routes(app)
+
+    # Adding liveness and readiness probes
+    add_health_routes(app)
+
+    app.include_router(router)
+    return app
+
+
+app = create_app()
+
+
 if __name__ == '__main__':
     uvicorn.run("app:app", port=5000, reload=True)
@@ -8,14 +8,20 @@ from datetime import datetime, timedelta
 import jwt
 from bson import ObjectId
 from db import get_db
+from metrics import timed
 
 # Password hashing setup
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# JWT setup
+# JWT setup (checked on use so a missing key doesn't break imports)
 SECRET_KEY = os.getenv("SECRET_KEY")
-if not SECRET_KEY:
-    raise ValueError("No SECRET_KEY environment variable set for JWT")
+
+
+def get_secret_key():
+    if not SECRET_KEY:
+        raise ValueError("No SECRET_KEY environment variable set for JWT")
+    return SECRET_KEY
+
 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(
@@ -68,6 +74,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/token")
 # Helper functions for auth
 
 
+@timed("user_lookup")
 async def get_user_by_email(db, email: str, user_type: str):
     collection = db[user_type + "s"]  # "employers" or "employees"
     user = await collection.find_one({"email": email})
@@ -86,7 +93,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.now() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY,   # type: ignore
+    encoded_jwt = jwt.encode(to_encode, get_secret_key(),
                              algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -109,7 +116,7 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[  # type: ignore
+        payload = jwt.decode(token, get_secret_key(), algorithms=[
                              ALGORITHM])  # type: ignore
         email: str = payload.get("sub")
         user_type: str = payload.get("user_type")
@@ -0,0 +1,34 @@
+"""
+Builds the employer_jobs summaries from existing employer_uploads.
+
+Usage: python backfill_jobs.py
+"""
+import argparse
+import asyncio
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from connections import close_connections
+from db import get_db
+from jobs import backfill_employer_jobs
+
+
+async def run():
+    start = time.perf_counter()
+    try:
+        count = await backfill_employer_jobs(get_db())
+    finally:
+        await close_connections()
+    print(f"Backfilled {count} jobs in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.parse_args()
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmarks the tiered PDF extraction against the pdfplumber-only path.
+
+Usage: python bench_extraction.py path/to/cvs/*.pdf [--repeat 3]
+"""
+import argparse
+import statistics
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from helpers import extract_pdf_fast, extract_pdf_layout, extract_pdf_document
+
+
+def time_call(func, path, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        with open(path, "rb") as file:
+            start = time.perf_counter()
+            result = func(file)
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("paths", nargs="+", help="PDF files to extract")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    total_layout = total_tiered = 0.0
+    tiers = {}
+    print(f"{'file':40} {'layout ms':>10} {'tiered ms':>10} {'tier':>7} {'fast chars':>10} {'layout chars':>12}")
+    for path in args.paths:
+        layout_time, layout = time_call(extract_pdf_layout, path, args.repeat)
+        tiered_time, tiered = time_call(extract_pdf_document, path, args.repeat)
+        _, fast = time_call(extract_pdf_fast, path, 1)
+        total_layout += layout_time
+        total_tiered += tiered_time
+        tiers[tiered["tier"]] = tiers.get(tiered["tier"], 0) + 1
+        fast_chars = len(fast["text"]) if fast else 0
+        print(f"{path[-40:]:40} {layout_time * 1000:10.1f} {tiered_time * 1000:10.1f} "
+              f"{tiered['tier']:>7} {fast_chars:10d} {len(layout['text']):12d}")
+
+    speedup = total_layout / total_tiered if total_tiered else 0.0
+    print(f"\nlayout total: {total_layout:.3f}s, tiered total: {total_tiered:.3f}s, "
+          f"speedup: {speedup:.1f}x, tiers used: {tiers}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import time
+from itertools import chain
+from dotenv import load_dotenv
+from metrics import (POOL_CHECKED_OUT, POOL_OPEN_CONNECTIONS, POOL_MAX_SIZE,
+                     POOL_WAIT_SECONDS, POOL_CHECKOUT_TIMEOUTS)
+
+# Load environment variables
+load_dotenv()
+
+
+# MongoDB settings (see pymongo's MongoClient for the option semantics)
+MONGO_URI = os.environ.get("MONGO_URI")
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(
+    os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+
+# Redis settings; credentials only come from the environment. An unset
+# REDIS_HOST is reported by /readyz, authentication errors by its ping
+REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", "6379"))
+REDIS_USERNAME = os.environ.get("REDIS_USERNAME") or None
+REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD") or None
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_MIN_CONNECTIONS = int(os.environ.get("REDIS_MIN_CONNECTIONS", "2"))
+REDIS_POOL_TIMEOUT = float(os.environ.get("REDIS_POOL_TIMEOUT", "5"))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", "5"))
+REDIS_CONNECT_TIMEOUT = float(os.environ.get("REDIS_CONNECT_TIMEOUT", "5"))
+
+mongo_client = None
+redis_client = None
+
+
+def _mongo_pool_listener():
+    """Builds a pymongo pool listener that feeds the pool gauges."""
+    from pymongo import monitoring
+
+    class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+        def pool_created(self, event):
+            POOL_MAX_SIZE.set("mongo", value=MONGO_MAX_POOL_SIZE)
+
+        def pool_ready(self, event):
+            pass
+
+        def pool_cleared(self, event):
+            pass
+
+        def pool_closed(self, event):
+            pass
+
+        def connection_created(self, event):
+            POOL_OPEN_CONNECTIONS.inc("mongo")
+
+        def connection_ready(self, event):
+            pass
+
+        def connection_closed(self, event):
+            POOL_OPEN_CONNECTIONS.dec("mongo")
+
+        def connection_check_out_started(self, event):
+            pass
+
+        def connection_check_out_failed(self, event):
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                POOL_CHECKOUT_TIMEOUTS.inc("mongo")
+
+        def connection_checked_out(self, event):
+            POOL_CHECKED_OUT.inc("mongo")
+            # Checkout duration is only reported by pymongo >= 4.7
+            duration = getattr(event, "duration", None)
+            if duration is not None:
+                POOL_WAIT_SECONDS.observe("mongo", value=duration)
+
+        def connection_checked_in(self, event):
+            POOL_CHECKED_OUT.dec("mongo")
+
+    return MongoPoolMetrics()
+
+
+def get_mongo_client():
+    """Returns the Motor client, creating it on first use."""
+    global mongo_client
+    if mongo_client is None:
+        if not MONGO_URI:
+            raise ValueError("No MONGO_URI environment variable set")
+        from motor.motor_asyncio import AsyncIOMotorClient
+        mongo_client = AsyncIOMotorClient(
+            MONGO_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            event_listeners=[_mongo_pool_listener()],
+        )  # type: ignore
+    return mongo_client
+
+
+def _redis_pool():
+    """Builds a blocking async Redis pool that reports checkout metrics."""
+    from redis.asyncio import BlockingConnectionPool
+    from redis.exceptions import ConnectionError as RedisConnectionError
+
+    class InstrumentedRedisPool(BlockingConnectionPool):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._checked_out = set()
+
+        async def get_connection(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                connection = await super().get_connection(*args, **kwargs)
+            except RedisConnectionError as e:
+                if "No connection available" in str(e):
+                    POOL_CHECKOUT_TIMEOUTS.inc("redis")
+                raise
+            POOL_WAIT_SECONDS.observe("redis", value=time.perf_counter() - started)
+            self._checked_out.add(connection)
+            POOL_CHECKED_OUT.inc("redis")
+            self._record_open_connections()
+            return connection
+
+        async def release(self, connection):
+            await super().release(connection)
+            # get_connection also releases connections that failed to connect,
+            # those were never counted as checked out
+            if connection in self._checked_out:
+                self._checked_out.discard(connection)
+                POOL_CHECKED_OUT.dec("redis")
+            self._record_open_connections()
+
+        def _record_open_connections(self):
+            connections = chain(self._available_connections, self._in_use_connections)
+            POOL_OPEN_CONNECTIONS.set(
+                "redis", value=sum(1 for connection in connections if connection.is_connected))
+
+    POOL_MAX_SIZE.set("redis", value=REDIS_MAX_CONNECTIONS)
+    return InstrumentedRedisPool(
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        username=REDIS_USERNAME,
+        password=REDIS_PASSWORD,
+        decode_responses=True,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+    )
+
+
+def get_redis_client():
+    """Returns the async Redis client, creating its pool on first use."""
+    global redis_client
+    if redis_client is None:
+        from redis.asyncio import Redis
+        redis_client = Redis(connection_pool=_redis_pool())
+    return redis_client
+
+
+async def warm_up_connections():
+    """
+    Opens the minimum number of Mongo and Redis connections so the first
+    requests don't pay the connection setup cost.
+    """
+    await get_mongo_client().admin.command("ping")
+
+    redis = get_redis_client()
+    await asyncio.gather(*(redis.ping() for _ in range(max(REDIS_MIN_CONNECTIONS, 1))))
+
+
+async def close_connections():
+    """Closes both pools; used on application shutdown."""
+    global mongo_client, redis_client
+    if mongo_client is not None:
+        mongo_client.close()
+        mongo_client = None
+    if redis_client is not None:
+        # The client doesn't own an explicitly passed pool, so close it here
+        await redis_client.connection_pool.disconnect()
+        POOL_OPEN_CONNECTIONS.set("redis", value=0)
+        redis_client = None
@@ -1,19 +1,10 @@
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
-from dotenv import load_dotenv
+from connections import get_mongo_client
 
-# Load environment variables
-load_dotenv()
+# Database name; the client and its pool are owned by connections.py
+MONGO_DB_NAME = os.environ.get("MONGO_DB_NAME", "ATS_Test")
 
-# Get MongoDB URI from environment
-MONGO_URI = os.environ["MONGO_URI"]
-if not MONGO_URI:
-    raise ValueError("No MONGO_URI environment variable set")
-
-# Create client once at module level
-client = AsyncIOMotorClient(MONGO_URI)  # type: ignore
-db = client.ATS_Test
 
 def get_db():
     """Returns the database instance."""
-    return db
+    return get_mongo_client()[MONGO_DB_NAME]
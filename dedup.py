@@ -0,0 +1,144 @@
+from hashlib import blake2b
+import os
+import random
+import re
+from metrics import timed, DUPLICATE_CANDIDATES
+
+
+# MinHash / LSH settings: 16 bands of 4 rows put the LSH candidate
+# threshold around 0.5 Jaccard, every candidate is then verified against
+# DUPLICATE_THRESHOLD using the full signature
+DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", "true").lower() == "true"
+DUPLICATE_THRESHOLD = float(os.environ.get("DUPLICATE_THRESHOLD", "0.85"))
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+MAX_HISTORY_CANDIDATES = 20
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)  # Fixed seed: signatures are persisted
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(NUM_PERMUTATIONS)]
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def shingles(text):
+    """Returns the set of hashed word shingles of a text."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return set()
+    if len(tokens) <= SHINGLE_SIZE:
+        return {_hash64(" ".join(tokens)) % _MERSENNE_PRIME}
+    return {_hash64(" ".join(tokens[i:i + SHINGLE_SIZE])) % _MERSENNE_PRIME
+            for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+@timed("fingerprint")
+def minhash_signature(text):
+    """
+    Computes the MinHash signature of a text, or None when the text has
+    no words (e.g. a scanned PDF) and can't be compared.
+    """
+    hashes = shingles(text)
+    if not hashes:
+        return None
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in _PERMUTATIONS]
+
+
+def lsh_bands(signature):
+    """Splits a signature into band keys used for candidate lookup."""
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = blake2b(" ".join(map(str, rows)).encode(), digest_size=8)
+        keys.append(f"{band}:{digest.hexdigest()}")
+    return keys
+
+
+def estimate_similarity(first, second):
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    matches = sum(1 for a, b in zip(first, second) if a == b)
+    return matches / NUM_PERMUTATIONS
+
+
+def jd_fingerprint(jd_text):
+    """Hash of the normalised JD, so scores are only reused for the same job."""
+    normalised = " ".join(_TOKEN_RE.findall((jd_text or "").lower()))
+    return blake2b(normalised.encode(), digest_size=16).hexdigest()
+
+
+class DuplicateIndex:
+    """In-memory LSH index of the representatives seen in one batch."""
+
+    def __init__(self, threshold=DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._buckets = {}
+
+    def add(self, signature, entry):
+        entry = {**entry, "cv_minhash": signature}
+        for key in lsh_bands(signature):
+            self._buckets.setdefault(key, []).append(entry)
+
+    def find(self, signature):
+        """Returns the most similar entry above the threshold, if any."""
+        return best_match(signature, (
+            entry for key in lsh_bands(signature)
+            for entry in self._buckets.get(key, ())
+        ), self.threshold)
+
+
+def best_match(signature, entries, threshold=DUPLICATE_THRESHOLD):
+    """
+    Returns the most similar entry at or above the threshold. On tied
+    scores an originally scored entry wins over one that was itself
+    stored as a duplicate.
+    """
+    best, best_key = None, None
+    seen = set()
+    for entry in entries:
+        if id(entry) in seen:
+            continue
+        seen.add(id(entry))
+        score = estimate_similarity(signature, entry["cv_minhash"])
+        key = (score, not entry.get("duplicate_of"))
+        if score >= threshold and (best_key is None or key > best_key):
+            best, best_key = entry, key
+    return best
+
+
+@timed("dedup_history")
+async def find_history_duplicate(db, user_id, jd_hash, signature):
+    """
+    Looks for an already scored near-duplicate CV that the same user
+    uploaded for the same JD.
+    """
+    candidates = await db.employer_uploads.find(
+        {
+            "user_id": user_id,
+            "jd_hash": jd_hash,
+            "cv_lsh_bands": {"$in": lsh_bands(signature)},
+            "analysis_result": {"$exists": True},
+        },
+        {"cv_filename": 1, "cv_minhash": 1, "analysis_result": 1, "employer_id": 1,
+         "duplicate_of": 1}
+    ).to_list(length=MAX_HISTORY_CANDIDATES)
+    return best_match(signature, candidates)
+
+
+def record_duplicate(source):
+    DUPLICATE_CANDIDATES.inc(source)
+
+
+async def create_dedup_indexes(db):
+    """Creates the index used by the history lookup."""
+    await db.employer_uploads.create_index(
+        [("user_id", 1), ("jd_hash", 1), ("cv_lsh_bands", 1)],
+        name="dedup_lookup"
+    )
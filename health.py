@@ -0,0 +1,99 @@
+from fastapi import FastAPI
+from api_responses import FastJSONResponse
+import asyncio
+import os
+import time
+from connections import get_mongo_client, get_redis_client, warm_up_connections
+from helpers import warm_up_libraries
+from skills import get_skill_matcher
+from db import get_db
+from dedup import create_dedup_indexes
+from jobs import create_job_indexes
+from lifecycle import create_lifecycle_indexes
+from metrics import STARTUP_SECONDS
+
+
+REQUIRED_ENV_VARS = ("MONGO_URI", "SECRET_KEY", "GEMINI_API_KEY", "REDIS_HOST")
+DEPENDENCY_TIMEOUT = float(os.environ.get("HEALTH_CHECK_TIMEOUT", "2"))
+
+
+async def check_mongo():
+    await asyncio.wait_for(get_mongo_client().admin.command("ping"), DEPENDENCY_TIMEOUT)
+
+
+async def check_redis():
+    await asyncio.wait_for(get_redis_client().ping(), DEPENDENCY_TIMEOUT)
+
+
+async def run_check(check):
+    """Runs a dependency check and reports "ok" or the error message."""
+    try:
+        await check()
+        return "ok"
+    except Exception as e:
+        return f"error: {str(e) or type(e).__name__}"
+
+
+async def create_indexes():
+    """
+    Creates the indexes the request paths rely on. Runs once at startup,
+    existing indexes are left as they are.
+    """
+    try:
+        db = get_db()
+        await create_dedup_indexes(db)
+        await create_job_indexes(db)
+        await create_lifecycle_indexes(db)
+    except Exception as e:
+        print(f"Database error creating indexes: {str(e)}")
+
+
+async def warm_up(app: FastAPI):
+    """
+    Imports the heavy libraries and fills the Mongo and Redis pools in the
+    background, so the first real request doesn't pay for them.
+    """
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(warm_up_libraries)
+        await asyncio.to_thread(get_skill_matcher)
+        connections = await run_check(warm_up_connections)
+        if connections != "ok":
+            # Dependencies are reported by /readyz, warm-up itself still completes
+            print(f"Connection warm-up {connections}")
+        app.state.warmup = "done"
+    except Exception as e:
+        print(f"Warm-up error: {str(e)}")
+        app.state.warmup = "failed"
+    finally:
+        STARTUP_SECONDS.set("warmup", value=time.perf_counter() - started)
+
+
+# Routes to add to FastAPI app
+
+
+def add_health_routes(app: FastAPI):
+    @app.get("/healthz")
+    async def healthz():
+        """Liveness: the process is up and serving requests."""
+        return {"status": "ok"}
+
+    @app.get("/readyz")
+    async def readyz():
+        """Readiness: configuration, warm-up and dependencies are all usable."""
+        missing_env = [name for name in REQUIRED_ENV_VARS if not os.environ.get(name)]
+        mongo, redis = await asyncio.gather(
+            run_check(check_mongo), run_check(check_redis))
+        warmup = getattr(app.state, "warmup", "skipped")
+        checks = {
+            "config": "ok" if not missing_env else f"missing: {', '.join(missing_env)}",
+            "warmup": warmup,
+            "mongo": mongo,
+            "redis": redis,
+        }
+        ready = (not missing_env and warmup in ("done", "skipped")
+                 and mongo == "ok" and redis == "ok")
+        return FastJSONResponse(
+            status_code=200 if ready else 503,
+            content={"status": "ready" if ready else "not ready", "checks": checks}
+        )
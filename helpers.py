@@ -1,110 +1,289 @@
 from fastapi import HTTPException, Request
+from functools import lru_cache
 import json
 import os
-import uuid
-import pdfplumber as pdf
-import docx
-import redis
-import google.generativeai as genai
-from google.ai.generativelanguage_v1beta.types import content
 import time
+import unicodedata
+from contextlib import closing
+from metrics import timed, record_rate_limit_check, EXTRACTED_PAGES, EXTRACTION_TIERS
+from uploads import validate_upload, MAX_PDF_PAGES
+from connections import get_redis_client
+from api_responses import json_loads
 
-
-# redis setup (local)
-redis_client = redis.Redis(
-    host='redis-13110.c264.ap-south-1-1.ec2.redns.redis-cloud.com',
-    port=13110,
-    decode_responses=True,
-    username="default",
-    password="wTzGEkFrYHtoSi2RTz3jy54yK297ywft",
-)
+# pdfplumber, pypdfium2, python-docx and google-generativeai are
+# imported on first use (or during warm-up) so importing this module is cheap
 
 
 # Google Gemini LLM setup
-genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-
-generation_config = {
-    "temperature": 1,
-    "top_p": 0.95,
-    "top_k": 40,
-    "max_output_tokens": 8192,
-    "response_schema": content.Schema(
-        type=content.Type.OBJECT,
-        properties={
-            "JD-Match": content.Schema(type=content.Type.NUMBER),
-            "Missing Skills": content.Schema(
-                type=content.Type.ARRAY,
-                items=content.Schema(type=content.Type.STRING),
-            ),
-            "Profile Summary": content.Schema(type=content.Type.STRING),
-            "Position": content.Schema(type=content.Type.INTEGER),
-        },
-    ),
-    "response_mime_type": "application/json",
-}
-model = genai.GenerativeModel(
-    model_name="gemini-1.5-flash-8b", generation_config=generation_config)  # type: ignore
+GEMINI_MODEL_NAME = "gemini-1.5-flash-8b"
+
+model = None
+
+
+def build_generation_config(content):
+    return {
+        "temperature": 1,
+        "top_p": 0.95,
+        "top_k": 40,
+        "max_output_tokens": 8192,
+        "response_schema": content.Schema(
+            type=content.Type.OBJECT,
+            properties={
+                "JD-Match": content.Schema(type=content.Type.NUMBER),
+                "Missing Skills": content.Schema(
+                    type=content.Type.ARRAY,
+                    items=content.Schema(type=content.Type.STRING),
+                ),
+                "Profile Summary": content.Schema(type=content.Type.STRING),
+                "Position": content.Schema(type=content.Type.INTEGER),
+            },
+        ),
+        "response_mime_type": "application/json",
+    }
+
+
+def get_model():
+    """Returns the Gemini model, importing and configuring the SDK on first use."""
+    global model
+    if model is None:
+        import google.generativeai as genai
+        from google.ai.generativelanguage_v1beta.types import content
+
+        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+        model = genai.GenerativeModel(
+            model_name=GEMINI_MODEL_NAME,
+            generation_config=build_generation_config(content))  # type: ignore
+    return model
+
+
+@lru_cache(maxsize=1)
+def get_pdfium():
+    """Returns pypdfium2 (shipped with pdfplumber) or None if unavailable."""
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        return None
+    return pdfium
+
+
+def warm_up_libraries():
+    """Imports the document parsers and the LLM SDK ahead of the first request."""
+    import pdfplumber  # noqa: F401
+    import docx  # noqa: F401
+    get_pdfium()
+    if os.environ.get("GEMINI_API_KEY"):
+        get_model()
 
 
 MAX_REQUESTS = int(os.environ.get("MAX_REQUESTS", "3"))  # Maximum number of requests allowed
 MAX_REQUESTS_FREE = int(os.environ.get("MAX_REQUESTS_FREE", "7"))  # max number of requests for free users
 RATE_LIMIT_WINDOW = 24 * 60 * 60  # 24 hours in seconds
 
+# Extraction budget: CV content worth sending to the LLM is near the top
+MAX_EXTRACT_PAGES = int(os.environ.get("MAX_EXTRACT_PAGES", "10"))
+MAX_EXTRACT_CHARS = int(os.environ.get("MAX_EXTRACT_CHARS", "30000"))
+
+# Fast PDF tier, escalated to pdfplumber when the text looks unusable
+PDF_FAST_EXTRACTION = os.environ.get("PDF_FAST_EXTRACTION", "true").lower() == "true"
+MIN_CHARS_PER_PAGE = int(os.environ.get("MIN_CHARS_PER_PAGE", "200"))
+MAX_GARBAGE_RATIO = float(os.environ.get("MAX_GARBAGE_RATIO", "0.05"))
+
 
 # Helper functions
 
 
-def extract_pdf_text(file):
-    """Extracts text from a PDF file object."""
-    temp_file_path = f"temp_{uuid.uuid4()}.pdf"
+def count_pdf_pages(pdf_file):
+    """Reads the page count from the PDF catalog without parsing any page."""
+    from pdfminer.pdftypes import resolve1
+
+    try:
+        return int(resolve1(pdf_file.doc.catalog["Pages"])["Count"])
+    except Exception:
+        return len(pdf_file.pages)
+
+
+def check_pdf_page_count(pages_total):
+    if pages_total > MAX_PDF_PAGES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"PDF exceeds the {MAX_PDF_PAGES} page limit."
+        )
+
+
+def iter_pdf_pages(pdf_file, max_pages=None):
+    """
+    Yields the text of each page in order, releasing the page's cached
+    layout objects as soon as its text has been taken.
+    """
+    for index, page in enumerate(pdf_file.pages):
+        if max_pages is not None and index >= max_pages:
+            break
+        try:
+            yield page.extract_text() or ""
+        finally:
+            page.close()
+
+
+def iter_pdfium_pages(pdf_doc, max_pages=None):
+    """Yields the raw text layer of each page using pdfium."""
+    for index in range(len(pdf_doc)):
+        if max_pages is not None and index >= max_pages:
+            break
+        page = pdf_doc[index]
+        textpage = page.get_textpage()
+        try:
+            yield textpage.get_text_range().replace("\r\n", "\n")
+        finally:
+            textpage.close()
+            page.close()
+
+
+def collect_pages(pages, max_chars):
+    """Consumes page texts until the character budget is spent."""
+    parts = []
+    chars = 0
+    with closing(pages):
+        for page_text in pages:
+            parts.append(page_text)
+            chars += len(page_text)
+            if chars >= max_chars:
+                break
+    return parts
+
+
+def text_quality(text, pages):
+    """
+    Returns (chars per page, garbage ratio) for extracted text. Garbage is
+    replacement, control and private-use characters, which show up when a
+    PDF has a broken font encoding.
+    """
+    visible = [ch for ch in text if not ch.isspace()]
+    if not visible:
+        return 0.0, 1.0
+    garbage = sum(1 for ch in visible
+                  if ch == "\ufffd" or unicodedata.category(ch) in ("Cc", "Co", "Cs"))
+    return len(visible) / max(pages, 1), garbage / len(visible)
+
+
+def is_usable_text(text, pages):
+    chars_per_page, garbage_ratio = text_quality(text, pages)
+    return chars_per_page >= MIN_CHARS_PER_PAGE and garbage_ratio <= MAX_GARBAGE_RATIO
+
+
+def build_pdf_result(parts, pages_total, max_chars, tier):
+    text = "\n".join(parts)
+    pages_skipped = max(pages_total - len(parts), 0)
+    EXTRACTED_PAGES.inc("extracted", amount=len(parts))
+    if pages_skipped:
+        EXTRACTED_PAGES.inc("skipped", amount=pages_skipped)
+    EXTRACTION_TIERS.inc(tier)
+    return {
+        "text": text[:max_chars],
+        "tier": tier,
+        "pages_total": pages_total,
+        "pages_extracted": len(parts),
+        "pages_skipped": pages_skipped,
+        "truncated": pages_skipped > 0 or len(text) > max_chars,
+    }
+
+
+@timed("extract_fast")
+def extract_pdf_fast(file, max_pages=MAX_EXTRACT_PAGES, max_chars=MAX_EXTRACT_CHARS):
+    """
+    Reads only the PDF text layer through pdfium, without any layout
+    analysis. Returns None when the text does not pass the quality check.
+    """
+    pdfium = get_pdfium()
+    if pdfium is None:
+        return None
+    file.seek(0)
+    try:
+        pdf_doc = pdfium.PdfDocument(file)
+        try:
+            pages_total = len(pdf_doc)
+            check_pdf_page_count(pages_total)
+            parts = collect_pages(iter_pdfium_pages(pdf_doc, max_pages), max_chars)
+        finally:
+            pdf_doc.close()
+    except pdfium.PdfiumError:
+        return None
+    finally:
+        file.seek(0)  # Reset file pointer for potential reuse
+
+    if not is_usable_text("\n".join(parts), len(parts)):
+        return None
+    return build_pdf_result(parts, pages_total, max_chars, "fast")
+
+
+@timed("extract_layout")
+def extract_pdf_layout(file, max_pages=MAX_EXTRACT_PAGES, max_chars=MAX_EXTRACT_CHARS):
+    """Extracts text with pdfplumber's character-level layout pass."""
+    import pdfplumber as pdf
+
+    # pdfplumber reads the seekable upload in place, no temporary copy needed
+    file.seek(0)
     try:
-        # Save uploaded file to a temporary location
-        with open(temp_file_path, "wb") as temp_file:
-            contents = file.read()
-            temp_file.write(contents)
-            file.seek(0)  # Reset file pointer for potential reuse
-
-        # Extract text from the saved file
-        text = ""
-        with pdf.open(temp_file_path) as pdf_file:
-            for page in pdf_file.pages:
-                text += page.extract_text() or ""
-        return text
+        with pdf.open(file) as pdf_file:
+            pages_total = count_pdf_pages(pdf_file)
+            check_pdf_page_count(pages_total)
+            parts = collect_pages(iter_pdf_pages(pdf_file, max_pages), max_chars)
     finally:
-        # Clean up temporary file
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        file.seek(0)  # Reset file pointer for potential reuse
+
+    return build_pdf_result(parts, pages_total, max_chars, "layout")
+
+
+def extract_pdf_document(file, max_pages=MAX_EXTRACT_PAGES, max_chars=MAX_EXTRACT_CHARS):
+    """
+    Extracts text from a PDF file object page by page, stopping once the
+    page or character budget is spent. The fast text-layer pass is tried
+    first and pdfplumber is only used when its output looks unusable.
+    """
+    if PDF_FAST_EXTRACTION:
+        document = extract_pdf_fast(file, max_pages, max_chars)
+        if document is not None:
+            return document
+    return extract_pdf_layout(file, max_pages, max_chars)
+
+
+def extract_pdf_text(file):
+    """Extracts text from a PDF file object."""
+    return extract_pdf_document(file)["text"]
 
 
 def extract_docx_text(file):
     """Extracts text from a DOCX file object."""
-    temp_file_path = f"temp_{uuid.uuid4()}.docx"
+    import docx
+
+    file.seek(0)
     try:
-        # Save uploaded file to a temporary location
-        with open(temp_file_path, "wb") as temp_file:
-            contents = file.read()
-            temp_file.write(contents)
-            file.seek(0)  # Reset file pointer for potential reuse
-
-        # Extract text from the saved file
-        doc = docx.Document(temp_file_path)
+        doc = docx.Document(file)
         return "\n".join([para.text for para in doc.paragraphs])
     finally:
-        # Clean up temporary file
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        file.seek(0)  # Reset file pointer for potential reuse
 
 
+@timed("llm")
 def get_llm_response(prompt):
     """Gets response from LLM."""
-    response = model.generate_content(prompt)
+    response = get_model().generate_content(prompt)
     return response.text
 
 
+# Marker placed in "Missing Skills" when the LLM output can't be parsed
+LLM_PARSE_ERROR = "Error parsing LLM response"
+
+
+def is_llm_parse_error(parsed_response):
+    """True for the fallback result of parse_llm_response."""
+    return LLM_PARSE_ERROR in parsed_response.get("Missing Skills", [])
+
+
+@timed("parse")
 def parse_llm_response(llm_response):
     """Parses LLM response into structured JSON."""
     try:
-        response_json = json.loads(llm_response)
+        response_json = json_loads(llm_response)
         return {
             "JD-Match": response_json.get("JD-Match", 0),
             "Missing Skills": response_json.get("Missing Skills", []),
@@ -114,25 +293,37 @@ def parse_llm_response(llm_response):
         # Handle case where LLM response is not valid JSON
         return {
             "JD-Match": 0,
-            "Missing Skills": ["Error parsing LLM response"],
+            "Missing Skills": [LLM_PARSE_ERROR],
             "Profile Summary": "Could not generate profile summary due to parsing error.",
         }
 
 
+@timed("extract")
+def extract_document(file, file_type=None):
+    """
+    Extracts text from a file after checking its size, extension and
+    magic bytes. Returns the text along with page statistics.
+    """
+    detected_type = validate_upload(file, file_type)
+
+    if detected_type == "pdf":
+        return extract_pdf_document(file.file)
+
+    text = extract_docx_text(file.file)
+    EXTRACTION_TIERS.inc("docx")
+    return {
+        "text": text[:MAX_EXTRACT_CHARS],
+        "tier": "docx",
+        "pages_total": None,
+        "pages_extracted": None,
+        "pages_skipped": 0,
+        "truncated": len(text) > MAX_EXTRACT_CHARS,
+    }
+
+
 def extract_text_from_file(file, file_type=None):
-    """Extracts text from a file based on its extension."""
-    if not file_type:
-        file_type = file.filename.lower()
-
-    if file_type.endswith(".pdf"):
-        return extract_pdf_text(file.file)
-    elif file_type.endswith(".docx"):
-        return extract_docx_text(file.file)
-    else:
-        raise HTTPException(
-            status_code=400,
-            detail="Unsupported file type. Please upload PDF or DOCX files."
-        )
+    """Extracts text from a file based on its extension and content."""
+    return extract_document(file, file_type)["text"]
 
 
 def get_client_identifier(request: Request) -> str:
@@ -145,7 +336,8 @@ def get_client_identifier(request: Request) -> str:
     return f"{ip}:{user_agent}"
 
 
-def check_rate_limit_demo(request: Request):
+@timed("rate_limit")
+async def check_rate_limit_demo(request: Request):
     """
     Check if the client has exceeded their rate limit using Redis.
     Returns the number of remaining requests.
@@ -156,7 +348,8 @@ def check_rate_limit_demo(request: Request):
     key = f"rate_limit:{client_id}"
 
     # Get the list of timestamps for this client
-    timestamps_data = redis_client.get(key)
+    timestamps_data = await get_redis_client().get(key)
+    record_rate_limit_check(timestamps_data is not None)
     timestamps = json.loads(
         timestamps_data) if timestamps_data else []  # type: ignore
 
@@ -193,13 +386,14 @@ def check_rate_limit_demo(request: Request):
     timestamps.append(current_time)
 
     # Store updated timestamps in Redis with TTL of RATE_LIMIT_WINDOW
-    redis_client.setex(key, RATE_LIMIT_WINDOW, json.dumps(timestamps))
+    await get_redis_client().setex(key, RATE_LIMIT_WINDOW, json.dumps(timestamps))
 
     # Return remaining requests
     return MAX_REQUESTS - len(timestamps)
 
 
-def check_rate_limit_free_users(request: Request):
+@timed("rate_limit")
+async def check_rate_limit_free_users(request: Request):
     """
     Check if the free client has exceeded their rate limit using Redis.
     Returns the number of remaining requests.
@@ -210,7 +404,8 @@ def check_rate_limit_free_users(request: Request):
     key_free = f"rate_limit:{client_id}"
 
     # Get the list of timestamps for this client
-    timestamps_data = redis_client.get(key_free)
+    timestamps_data = await get_redis_client().get(key_free)
+    record_rate_limit_check(timestamps_data is not None)
     timestamps = json.loads(
         timestamps_data) if timestamps_data else []  # type: ignore
 
@@ -247,7 +442,7 @@ def check_rate_limit_free_users(request: Request):
     timestamps.append(current_time)
 
     # Store updated timestamps in Redis with TTL of RATE_LIMIT_WINDOW
-    redis_client.setex(key_free, RATE_LIMIT_WINDOW, json.dumps(timestamps))
+    await get_redis_client().setex(key_free, RATE_LIMIT_WINDOW, json.dumps(timestamps))
 
     # Return remaining requests
     return MAX_REQUESTS_FREE - len(timestamps)
\ No newline at end of file
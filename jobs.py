@@ -0,0 +1,87 @@
+from metrics import timed
+
+
+# Per-job summary of employer uploads, kept up to date as candidates are
+# stored so the history page doesn't have to group every upload. Summaries
+# are not subject to retention: they are one small document per job and are
+# read through an index, so history keeps listing jobs whose uploads were
+# archived (see lifecycle.py)
+JD_PREVIEW_LENGTH = 100
+
+
+def jd_preview(jd_text):
+    jd_text = jd_text or ""
+    if len(jd_text) > JD_PREVIEW_LENGTH:
+        return jd_text[:JD_PREVIEW_LENGTH] + "..."
+    return jd_text
+
+
+@timed("job_summary")
+async def record_job_candidates(db, user_id, employer_id, jd_text, scores, created_at):
+    """
+    Adds the candidates stored for a job to its summary, creating the
+    summary on the first call. Counts are incremented, so several calls
+    for the same job add up.
+    """
+    update = {
+        "$setOnInsert": {
+            "user_id": user_id,
+            "jd_preview": jd_preview(jd_text),
+            "created_at": created_at,
+        },
+        "$inc": {"candidate_count": len(scores)},
+    }
+    top_score = max((score for score in scores if score is not None), default=None)
+    if top_score is not None:
+        update["$max"] = {"top_score": top_score}
+    await db.employer_jobs.update_one({"_id": employer_id}, update, upsert=True)
+
+
+async def backfill_employer_jobs(db):
+    """
+    Rebuilds the summaries from employer_uploads and its archive. Values
+    are recomputed and overwritten, so running it again is safe. Returns
+    the job count.
+    """
+    from pymongo import UpdateOne
+
+    await create_job_indexes(db)
+    jobs = await db.employer_uploads.aggregate([
+        # Archived uploads keep employer_id, created_at and analysis_result,
+        # their JD text is compressed but a jd_preview is stored
+        {"$unionWith": {
+            "coll": "employer_uploads_archive",
+            "pipeline": [{"$project": {"payload": 0}}],
+        }},
+        {"$group": {
+            "_id": "$employer_id",
+            "user_id": {"$first": "$user_id"},
+            "jd_text": {"$max": "$jd_text"},
+            "jd_preview": {"$max": "$jd_preview"},
+            "created_at": {"$min": "$created_at"},
+            "candidate_count": {"$sum": 1},
+            "top_score": {"$max": "$analysis_result.JD-Match"},
+        }}
+    ]).to_list(length=None)
+
+    operations = [
+        UpdateOne({"_id": job["_id"]}, {"$set": {
+            "user_id": job["user_id"],
+            "jd_preview": jd_preview(job["jd_text"]) if job["jd_text"] else job["jd_preview"] or "",
+            "created_at": job["created_at"],
+            "candidate_count": job["candidate_count"],
+            "top_score": job["top_score"],
+        }}, upsert=True)
+        for job in jobs if job["_id"] is not None
+    ]
+    if operations:
+        await db.employer_jobs.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+async def create_job_indexes(db):
+    """Creates the index used by the history page."""
+    await db.employer_jobs.create_index(
+        [("user_id", 1), ("created_at", -1)],
+        name="user_recent_jobs"
+    )
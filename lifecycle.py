@@ -0,0 +1,205 @@
+from datetime import datetime, timedelta
+import asyncio
+import os
+import zlib
+from api_responses import json_dumps, json_loads
+from jobs import jd_preview
+from metrics import timed, ARCHIVED_RECORDS, ARCHIVE_READS
+
+
+# Uploads older than the hot retention are moved by a background compactor
+# to "<collection>_archive". The analysis fields stay queryable there, the
+# bulky ones are zlib-compressed into a single "payload" field.
+LIFECYCLE_ENABLED = os.environ.get("LIFECYCLE_ENABLED", "true").lower() == "true"
+LIFECYCLE_INTERVAL_SECONDS = int(os.environ.get("LIFECYCLE_INTERVAL_SECONDS", "3600"))
+COMPACTION_BATCH_SIZE = int(os.environ.get("COMPACTION_BATCH_SIZE", "500"))
+ARCHIVE_SUFFIX = "_archive"
+COMPRESSED_FIELDS = ("cv_text", "jd_text", "cv_minhash", "cv_lsh_bands")
+
+
+def _policy(user_type):
+    """
+    Retention for one user type's uploads. 0 disables a limit: hot_days and
+    max_hot_documents bound the hot collection, archive_days expires
+    archived records (0 keeps them forever).
+    """
+    prefix = user_type.upper()
+    return {
+        "user_type": user_type,
+        "hot_days": int(os.environ.get(f"{prefix}_HOT_RETENTION_DAYS", "90")),
+        "max_hot_documents": int(os.environ.get(f"{prefix}_MAX_HOT_UPLOADS", "0")),
+        "archive_days": int(os.environ.get(f"{prefix}_ARCHIVE_RETENTION_DAYS", "0")),
+    }
+
+
+RETENTION_POLICIES = {
+    "employee_uploads": _policy("employee"),
+    "employer_uploads": _policy("employer"),
+}
+
+
+def archive_name(collection):
+    return collection + ARCHIVE_SUFFIX
+
+
+def pack_record(record, archived_at):
+    """Builds the archived form of a record."""
+    archived = {key: value for key, value in record.items() if key not in COMPRESSED_FIELDS}
+    bulky = {key: record[key] for key in COMPRESSED_FIELDS if key in record}
+    archived["jd_preview"] = jd_preview(record.get("jd_text"))
+    archived["payload"] = zlib.compress(json_dumps(bulky), 6)
+    archived["archived_at"] = archived_at
+    return archived
+
+
+def unpack_record(archived):
+    """Restores the full record from its archived form."""
+    record = {key: value for key, value in archived.items()
+              if key not in ("payload", "jd_preview")}
+    if archived.get("payload"):
+        record.update(json_loads(zlib.decompress(archived["payload"])))
+    return record
+
+
+async def create_lifecycle_indexes(db):
+    """
+    Creates the archive collections (zstd block compression where the
+    server supports it) and the indexes used by compaction and reads.
+    """
+    existing = set(await db.list_collection_names())
+    for collection, policy in RETENTION_POLICIES.items():
+        archive = archive_name(collection)
+        if archive not in existing:
+            try:
+                await db.create_collection(archive, storageEngine={
+                    "wiredTiger": {"configString": "block_compressor=zstd"}})
+            except Exception as e:
+                print(f"Database error creating {archive}: {str(e)}")
+        await db[collection].create_index([("created_at", 1)], name="lifecycle_created_at")
+        await db[archive].create_index(
+            [("user_id", 1), ("created_at", -1)], name="user_recent_uploads")
+        await db[archive].create_index([("employer_id", 1)], name="employer_id")
+        if policy["archive_days"]:
+            await db[archive].create_index(
+                [("archived_at", 1)], name="archive_expiry",
+                expireAfterSeconds=policy["archive_days"] * 24 * 60 * 60)
+
+
+async def compaction_filter(db, collection, policy, now=None):
+    """Selects the records that no longer belong in the hot collection."""
+    conditions = []
+    if policy["hot_days"]:
+        now = now or datetime.now()
+        conditions.append({"created_at": {"$lt": now - timedelta(days=policy["hot_days"])}})
+    if policy["max_hot_documents"]:
+        # Oldest record still allowed in the hot set
+        boundary = await db[collection].find({}, {"created_at": 1}).sort(
+            "created_at", -1).skip(policy["max_hot_documents"] - 1).to_list(length=1)
+        if boundary:
+            conditions.append({"created_at": {"$lt": boundary[0]["created_at"]}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$or": conditions}
+
+
+@timed("compaction")
+async def compact_collection(db, collection, policy, batch_size=COMPACTION_BATCH_SIZE):
+    """
+    Moves expired records to the archive, oldest first. Records are
+    written to the archive before being deleted from the hot collection,
+    and the write is an upsert, so an interrupted run can simply be
+    repeated. Returns the number of records moved.
+    """
+    from pymongo import ReplaceOne
+
+    query = await compaction_filter(db, collection, policy)
+    if query is None:
+        return 0
+
+    moved = 0
+    while True:
+        batch = await db[collection].find(query).sort(
+            "created_at", 1).to_list(length=batch_size)
+        if not batch:
+            break
+        archived_at = datetime.now()
+        await db[archive_name(collection)].bulk_write([
+            ReplaceOne({"_id": record["_id"]}, pack_record(record, archived_at), upsert=True)
+            for record in batch
+        ], ordered=False)
+        await db[collection].delete_many({"_id": {"$in": [record["_id"] for record in batch]}})
+        ARCHIVED_RECORDS.inc(collection, amount=len(batch))
+        moved += len(batch)
+        if len(batch) < batch_size:
+            break
+    return moved
+
+
+async def compact_all(db):
+    return {collection: await compact_collection(db, collection, policy)
+            for collection, policy in RETENTION_POLICIES.items()}
+
+
+async def run_compactor(get_db, after=None, interval=LIFECYCLE_INTERVAL_SECONDS):
+    """
+    Background task: compacts the upload collections every interval, once
+    the after task (the startup index creation) has finished.
+    """
+    if after is not None:
+        await asyncio.wait([after])
+    while True:
+        try:
+            moved = await compact_all(get_db())
+            if any(moved.values()):
+                print(f"Archived uploads: {moved}")
+        except Exception as e:
+            print(f"Compaction error: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+async def find_upload(db, collection, query):
+    """
+    Returns a single upload from the hot collection, or restores it from
+    the archive. Restored records carry "archived_at".
+    """
+    record = await db[collection].find_one(query)
+    if record is not None:
+        return record
+    archived = await db[archive_name(collection)].find_one(query)
+    if archived is None:
+        return None
+    ARCHIVE_READS.inc(collection)
+    return unpack_record(archived)
+
+
+async def find_uploads(db, collection, query, limit):
+    """
+    Returns up to limit uploads matching query from both tiers, without
+    the bulky fields.
+    """
+    records = await db[collection].find(
+        query, {field: 0 for field in COMPRESSED_FIELDS}).to_list(length=limit)
+    if len(records) < limit:
+        archived = await db[archive_name(collection)].find(
+            query, {"payload": 0}).to_list(length=limit - len(records))
+        if archived:
+            ARCHIVE_READS.inc(collection, amount=len(archived))
+        records.extend(archived)
+    return records
+
+
+async def find_recent_uploads(db, collection, query, limit):
+    """
+    Returns the newest uploads matching query, reading the archive only
+    when the hot collection holds fewer than limit. The compressed payload
+    is not returned.
+    """
+    records = await db[collection].find(query).sort(
+        "created_at", -1).to_list(length=limit)
+    if len(records) < limit:
+        archived = await db[archive_name(collection)].find(
+            query, {"payload": 0}).sort("created_at", -1).to_list(length=limit - len(records))
+        if archived:
+            ARCHIVE_READS.inc(collection, amount=len(archived))
+        records.extend(archived)
+    return records
@@ -0,0 +1,359 @@
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from starlette.routing import Match
+from contextvars import ContextVar
+from bisect import bisect_left
+import asyncio
+import functools
+import inspect
+import threading
+import time
+
+
+# Histogram buckets in seconds, stretched to cover slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Label used for stages timed outside of an HTTP request
+NO_ENDPOINT = "-"
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace(
+            "\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(
+                labelvalues, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        for labelvalues, value in sorted(self.snapshot().items()):
+            yield self.name + _format_labels(self.labelnames, labelvalues), value
+
+
+class Gauge(Counter):
+    """Value per label set that can go up and down."""
+
+    kind = "gauge"
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, *labelvalues, value):
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class Histogram:
+    """Bucketed observations per label set (cumulative on exposition)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *labelvalues, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                state = self._values[labelvalues] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {k: (list(v[0]), v[1], v[2])
+                      for k, v in self._values.items()}
+        for labelvalues, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(
+                    self.labelnames, labelvalues, ("le", _format_value(float(bound))))
+                yield f"{self.name}_bucket{labels}", cumulative
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels}", total
+            yield f"{self.name}_count{labels}", count
+
+
+# Metric registry
+
+REQUESTS_TOTAL = Counter(
+    "http_requests_total", "HTTP requests by endpoint and status code.",
+    ("endpoint", "method", "status"))
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "End-to-end HTTP request latency.",
+    ("endpoint", "method"))
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served.",
+    ("endpoint",))
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds", "Latency of individual pipeline stages.",
+    ("endpoint", "stage"))
+STAGE_ERRORS = Counter(
+    "stage_errors_total", "Pipeline stages that raised an exception.",
+    ("endpoint", "stage"))
+STAGES_IN_FLIGHT = Gauge(
+    "stage_in_flight", "Pipeline stages currently executing.", ("stage",))
+RATE_LIMIT_CHECKS = Counter(
+    "rate_limit_checks_total",
+    "Rate limit checks by client (new, or existing with recent requests).",
+    ("client",))
+
+EXTRACTED_PAGES = Counter(
+    "extraction_pages_total", "PDF pages extracted or skipped by the page budget.",
+    ("result",))
+EXTRACTION_TIERS = Counter(
+    "extraction_tier_total", "Documents extracted per extraction tier.",
+    ("tier",))
+DUPLICATE_CANDIDATES = Counter(
+    "duplicate_candidates_total",
+    "Candidate CVs whose score was reused from a near-duplicate.", ("source",))
+STARTUP_SECONDS = Gauge(
+    "startup_seconds", "Time spent in each startup phase.", ("phase",))
+POOL_CHECKED_OUT = Gauge(
+    "pool_connections_checked_out", "Connections currently checked out of a pool.",
+    ("pool",))
+POOL_OPEN_CONNECTIONS = Gauge(
+    "pool_connections_open", "Connections currently open in a pool.", ("pool",))
+POOL_MAX_SIZE = Gauge(
+    "pool_max_size", "Configured maximum size of a pool.", ("pool",))
+POOL_WAIT_SECONDS = Histogram(
+    "pool_checkout_wait_seconds", "Time spent waiting to check out a connection.",
+    ("pool",), buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                        0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+POOL_CHECKOUT_TIMEOUTS = Counter(
+    "pool_checkout_timeouts_total", "Checkouts that timed out waiting for a free connection.",
+    ("pool",))
+ARCHIVED_RECORDS = Counter(
+    "lifecycle_archived_records_total", "Records moved to the compressed archive.",
+    ("collection",))
+ARCHIVE_READS = Counter(
+    "lifecycle_archive_reads_total", "Records read back from the compressed archive.",
+    ("collection",))
+
+REGISTRY = [REQUESTS_TOTAL, REQUEST_LATENCY, REQUESTS_IN_FLIGHT, STAGE_LATENCY,
+            STAGE_ERRORS, STAGES_IN_FLIGHT, RATE_LIMIT_CHECKS,
+            EXTRACTED_PAGES, EXTRACTION_TIERS, DUPLICATE_CANDIDATES,
+            STARTUP_SECONDS, POOL_CHECKED_OUT, POOL_OPEN_CONNECTIONS, POOL_MAX_SIZE,
+            POOL_WAIT_SECONDS, POOL_CHECKOUT_TIMEOUTS, ARCHIVED_RECORDS, ARCHIVE_READS]
+
+
+class RequestTiming:
+    """Per-request state used to build the Server-Timing header."""
+
+    __slots__ = ("endpoint", "stages")
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.stages = {}
+
+
+_current_request = ContextVar("current_request_timing", default=None)
+
+# (endpoint, stage) being timed, per task or thread
+_current_stage = ContextVar("current_stage", default=None)
+
+# Copies of _current_stage for the profiler's sampling thread, which can't
+# read other threads' contexts: per worker thread, and per task on event
+# loop threads, where the stages of concurrent requests interleave
+THREAD_STAGES = {}
+TASK_STAGES = {}
+LOOP_THREADS = {}
+
+
+def current_endpoint():
+    """Returns the route template of the request being served, if any."""
+    timing = _current_request.get()
+    return timing.endpoint if timing else NO_ENDPOINT
+
+
+def _publish_stage():
+    tag = _current_stage.get()
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        LOOP_THREADS[threading.get_ident()] = task.get_loop()
+        registry, key = TASK_STAGES, task
+    else:
+        registry, key = THREAD_STAGES, threading.get_ident()
+    if tag is None:
+        registry.pop(key, None)
+    else:
+        registry[key] = tag
+
+
+def stage_for_thread(thread_id):
+    """
+    Returns the (endpoint, stage) a thread is working on, or None. For an
+    event loop thread this is the stage of the task currently running.
+    """
+    loop = LOOP_THREADS.get(thread_id)
+    if loop is None:
+        return THREAD_STAGES.get(thread_id)
+    task = asyncio.current_task(loop)
+    return TASK_STAGES.get(task) if task is not None else None
+
+
+def record_stage(stage, duration, error=False):
+    """Records a stage duration against the current endpoint."""
+    timing = _current_request.get()
+    endpoint = timing.endpoint if timing else NO_ENDPOINT
+    STAGE_LATENCY.observe(endpoint, stage, value=duration)
+    if error:
+        STAGE_ERRORS.inc(endpoint, stage)
+    if timing is not None:
+        timing.stages[stage] = timing.stages.get(stage, 0.0) + duration
+
+
+def record_rate_limit_check(existing):
+    """Counts a rate limit check for a new or an existing client."""
+    RATE_LIMIT_CHECKS.inc("existing" if existing else "new")
+
+
+class timed:
+    """
+    Times a pipeline stage. Usable as a context manager or as a decorator
+    on both sync and async functions.
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+        self._start = 0.0
+        self._token = None
+
+    def __enter__(self):
+        STAGES_IN_FLIGHT.inc(self.stage)
+        self._token = _current_stage.set((current_endpoint(), self.stage))
+        _publish_stage()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        STAGES_IN_FLIGHT.dec(self.stage)
+        _current_stage.reset(self._token)
+        _publish_stage()
+        record_stage(self.stage, duration, error=exc_type is not None)
+        return False
+
+    def __call__(self, func):
+        stage = self.stage
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def render_metrics():
+    """Renders every registered metric in the Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample, value in metric.samples():
+            lines.append(f"{sample} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def server_timing_header(timing, total):
+    """Builds a Server-Timing header value from the recorded stages."""
+    entries = [f"{stage};dur={duration * 1000:.1f}"
+               for stage, duration in timing.stages.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def _route_label(request: Request):
+    """Resolves the route template so labels stay low-cardinality."""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", request.url.path)
+    return "unmatched"
+
+
+# Routes to add to FastAPI app
+
+
+def add_metrics_routes(app: FastAPI):
+    @app.middleware("http")
+    async def metrics_middleware(request: Request, call_next):
+        endpoint = _route_label(request)
+        timing = RequestTiming(endpoint)
+        token = _current_request.set(timing)
+        REQUESTS_IN_FLIGHT.inc(endpoint)
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            total = time.perf_counter() - start
+            response.headers["Server-Timing"] = server_timing_header(
+                timing, total)
+            return response
+        finally:
+            duration = time.perf_counter() - start
+            REQUESTS_IN_FLIGHT.dec(endpoint)
+            REQUEST_LATENCY.observe(endpoint, request.method, value=duration)
+            REQUESTS_TOTAL.inc(endpoint, request.method, str(status_code))
+            _current_request.reset(token)
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return PlainTextResponse(
+            render_metrics(),
+            media_type="text/plain; version=0.0.4; charset=utf-8"
+        )
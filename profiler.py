@@ -0,0 +1,237 @@
+from fastapi import FastAPI, HTTPException, Request, Header
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from collections import Counter, OrderedDict
+from typing import Optional
+import asyncio
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from metrics import stage_for_thread
+
+
+# Profiling is disabled unless an admin token is configured
+PROFILER_TOKEN = os.environ.get("PROFILER_TOKEN", "")
+MAX_SAMPLE_SECONDS = int(os.environ.get("PROFILER_MAX_SECONDS", "120"))
+MAX_STORED_PROFILES = int(os.environ.get("PROFILER_MAX_STORED", "20"))
+PROFILE_HEADER = "x-profile"
+
+# Leaf frames of threads that are parked waiting for work
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+}
+
+
+def is_profiler_authorized(token: Optional[str]) -> bool:
+    """Checks the admin token; always False when profiling is disabled."""
+    if not PROFILER_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), PROFILER_TOKEN.encode())
+
+
+def require_profiler_token(x_profiler_token: Optional[str] = Header(None)):
+    if not PROFILER_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not is_profiler_authorized(x_profiler_token):
+        raise HTTPException(status_code=403, detail="Invalid profiler token")
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """
+    Periodically samples the stacks of every thread from a background thread
+    and aggregates them into collapsed ("folded") stacks, the input format
+    of flamegraph.pl, speedscope and inferno. Each stack is prefixed with the
+    endpoint and pipeline stage active on that thread.
+    """
+
+    def __init__(self, interval=0.01, include_idle=False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks = Counter()
+        self.samples = 0
+
+    def sample_once(self, own_thread_id):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread_id:
+                continue
+            code = frame.f_code
+            leaf = (os.path.basename(code.co_filename), code.co_name)
+            if not self.include_idle and leaf in IDLE_FRAMES:
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.reverse()
+
+            endpoint, stage = stage_for_thread(thread_id) or ("untagged", "untagged")
+            stack[:0] = [f"endpoint={endpoint}", f"stage={stage}"]
+            self.stacks[";".join(stack)] += 1
+            self.samples += 1
+
+    def run(self, duration):
+        own_thread_id = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            self.sample_once(own_thread_id)
+            time.sleep(self.interval)
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n"
+                       for stack, count in self.stacks.most_common())
+
+
+_sampling_lock = threading.Lock()
+_request_profile_lock = threading.Lock()
+
+# Deterministic per-request profiles, most recent last
+_request_profiles = OrderedDict()
+
+
+def _store_request_profile(profile_id, endpoint, profile):
+    profile.create_stats()
+    _request_profiles[profile_id] = {
+        "endpoint": endpoint,
+        "created_at": time.time(),
+        "stats": profile.stats,  # type: ignore
+    }
+    while len(_request_profiles) > MAX_STORED_PROFILES:
+        _request_profiles.popitem(last=False)
+
+
+class _StoredStats:
+    """Adapter letting pstats read an already collected stats dict."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def _render_stats_text(stats_dict, limit=60):
+    stream = io.StringIO()
+    pstats.Stats(_StoredStats(stats_dict), stream=stream).sort_stats(
+        "cumulative").print_stats(limit)
+    return stream.getvalue()
+
+
+# Routes to add to FastAPI app
+
+
+def add_profiler_routes(app: FastAPI):
+    @app.middleware("http")
+    async def request_profiler_middleware(request: Request, call_next):
+        # Only profile when explicitly asked by an admin
+        if PROFILE_HEADER not in request.headers or not is_profiler_authorized(
+                request.headers.get("x-profiler-token")):
+            return await call_next(request)
+
+        # cProfile hooks the whole event loop thread: requests served at the
+        # same time are included, sync stages that FastAPI offloads to its
+        # threadpool are not. Only one profiler can be active per thread.
+        if not _request_profile_lock.acquire(blocking=False):
+            return JSONResponse(
+                status_code=409, content={"detail": "A request profile is already running."})
+
+        try:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                response = await call_next(request)
+            finally:
+                profile.disable()
+        finally:
+            _request_profile_lock.release()
+
+        profile_id = str(uuid.uuid4())
+        _store_request_profile(profile_id, request.url.path, profile)
+        response.headers["X-Profile-Id"] = profile_id
+        return response
+
+    @app.post("/api/admin/profile/sample", response_class=PlainTextResponse)
+    async def sample_profile(
+        seconds: float = 10,
+        interval_ms: float = 10,
+        include_idle: bool = False,
+        x_profiler_token: Optional[str] = Header(None)
+    ):
+        """
+        Samples the running process for a fixed window and returns the
+        collapsed stacks, ready for flamegraph.pl or speedscope.
+        """
+        require_profiler_token(x_profiler_token)
+        if not 0 < seconds <= MAX_SAMPLE_SECONDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"seconds must be between 0 and {MAX_SAMPLE_SECONDS}."
+            )
+        if not _sampling_lock.acquire(blocking=False):
+            raise HTTPException(
+                status_code=409, detail="A sampling window is already running.")
+
+        try:
+            profiler = SamplingProfiler(
+                interval=max(interval_ms, 1) / 1000, include_idle=include_idle)
+            # Sample from a worker thread so the event loop keeps serving
+            await asyncio.to_thread(profiler.run, seconds)
+        finally:
+            _sampling_lock.release()
+
+        return PlainTextResponse(
+            profiler.folded(),
+            headers={"X-Profile-Samples": str(profiler.samples)}
+        )
+
+    @app.get("/api/admin/profile/requests")
+    async def list_request_profiles(x_profiler_token: Optional[str] = Header(None)):
+        """Lists the stored per-request profiles, newest first."""
+        require_profiler_token(x_profiler_token)
+        return {
+            "profiles": [
+                {"profile_id": profile_id, "endpoint": entry["endpoint"],
+                 "created_at": entry["created_at"]}
+                for profile_id, entry in reversed(_request_profiles.items())
+            ]
+        }
+
+    @app.get("/api/admin/profile/requests/{profile_id}")
+    async def get_request_profile(
+        profile_id: str,
+        format: str = "text",
+        x_profiler_token: Optional[str] = Header(None)
+    ):
+        """
+        Returns a per-request profile, either as a text report or as a pstats
+        file (format=pstats) for snakeviz, flameprof or gprof2dot. It covers
+        everything the event loop ran meanwhile, other requests included.
+        """
+        require_profiler_token(x_profiler_token)
+        entry = _request_profiles.get(profile_id)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+
+        if format == "pstats":
+            return Response(
+                content=marshal.dumps(entry["stats"]),
+                media_type="application/octet-stream",
+                headers={
+                    "Content-Disposition": f'attachment; filename="{profile_id}.pstats"'}
+            )
+        return PlainTextResponse(
+            f"endpoint: {entry['endpoint']}\n\n" + _render_stats_text(entry["stats"]))
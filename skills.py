@@ -0,0 +1,142 @@
+from functools import lru_cache
+from collections import deque
+import json
+import os
+import re
+from metrics import timed
+
+
+SKILLS_TAXONOMY_PATH = os.environ.get(
+    "SKILLS_TAXONOMY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "skills_taxonomy.json"))
+
+# "off": disabled, "augment": add coverage and use the local list for
+# ranking ties, "replace": also use the local list as "Missing Skills"
+SKILL_MATCHER_MODE = os.environ.get("SKILL_MATCHER_MODE", "augment").lower()
+
+# Keeps symbols that are part of skill names (c++, c#, node.js, .net);
+# "/" and "-" split tokens so "react/redux" still yields both skills. Dotted
+# tokens that are not in the taxonomy are split again by SkillMatcher, so
+# "python.django" yields both skills
+_TOKEN_RE = re.compile(r"\.net\b|[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9][a-z0-9+#]*)*")
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def load_taxonomy(path=SKILLS_TAXONOMY_PATH):
+    """
+    Loads a {canonical skill: [synonyms]} mapping from a JSON file. Only the
+    synonyms are matched, so ambiguous names ("Go", "R") can be left out and
+    skills named by ordinary words ("react", "excel", "spark") are listed
+    only in forms that carry context ("react.js", "ms excel", "apache spark").
+    """
+    with open(path, encoding="utf-8") as taxonomy_file:
+        return json.load(taxonomy_file)
+
+
+class SkillMatcher:
+    """
+    Aho-Corasick automaton over word tokens. Every synonym in the taxonomy
+    is compiled once, then a text is scanned in a single pass regardless of
+    how many skills the taxonomy holds.
+    """
+
+    def __init__(self, taxonomy):
+        self.skills = list(taxonomy)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        self._dotted = set()
+
+        for skill, synonyms in taxonomy.items():
+            for phrase in synonyms:
+                tokens = tokenize(phrase)
+                if tokens:
+                    self._add(tokens, skill)
+                    self._dotted.update(token for token in tokens if "." in token)
+        self._build_failure_links()
+
+    def _add(self, tokens, skill):
+        node = 0
+        for token in tokens:
+            next_node = self._goto[node].get(token)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][token] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            node = next_node
+        if skill not in self._output[node]:
+            self._output[node] = self._output[node] + (skill,)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(token, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + tuple(
+                    skill for skill in self._output[self._fail[child]]
+                    if skill not in self._output[child])
+
+    def _tokens(self, text):
+        for token in tokenize(text):
+            if "." in token and token not in self._dotted:
+                yield from (part for part in token.split(".") if part)
+            else:
+                yield token
+
+    def extract(self, text):
+        """Returns the canonical skills found in a text, in order of appearance."""
+        goto, fail, output = self._goto, self._fail, self._output
+        found = {}
+        node = 0
+        for token in self._tokens(text):
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            for skill in output[node]:
+                found.setdefault(skill, None)
+        return list(found)
+
+
+@lru_cache(maxsize=1)
+def get_skill_matcher():
+    """Returns the matcher for the configured taxonomy, built once."""
+    return SkillMatcher(load_taxonomy())
+
+
+@timed("skills")
+def match_skills(required_skills, cv_text, matcher=None):
+    """
+    Compares the skills required by a JD with those found in a CV.
+    Coverage is a percentage, or None when the JD names no known skill.
+    """
+    matcher = matcher or get_skill_matcher()
+    cv_skills = set(matcher.extract(cv_text))
+    matched = [skill for skill in required_skills if skill in cv_skills]
+    missing = [skill for skill in required_skills if skill not in cv_skills]
+    coverage = round(100 * len(matched) / len(required_skills)) if required_skills else None
+    return {
+        "required": list(required_skills),
+        "matched": matched,
+        "missing": missing,
+        "coverage": coverage,
+    }
+
+
+def apply_skill_match(parsed_response, skill_match):
+    """Adds the local skill analysis to an LLM result, per SKILL_MATCHER_MODE."""
+    result = dict(parsed_response)
+    result["Skill Coverage"] = skill_match["coverage"]
+    if SKILL_MATCHER_MODE == "replace":
+        result["Missing Skills"] = skill_match["missing"]
+    return result
@@ -0,0 +1,147 @@
+from fastapi import FastAPI, HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+import os
+import zipfile
+from metrics import timed
+
+
+# Upload limits (bytes), tunable per deployment. MAX_REQUEST_BYTES is
+# enforced while the body streams in; MAX_UPLOAD_BYTES applies per file and
+# is checked once the multipart parser has spooled the file
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_REQUEST_BYTES", str(50 * 1024 * 1024)))
+MAX_DOCX_UNCOMPRESSED_BYTES = int(
+    os.environ.get("MAX_DOCX_UNCOMPRESSED_BYTES", str(50 * 1024 * 1024)))
+MAX_PDF_PAGES = int(os.environ.get("MAX_PDF_PAGES", "30"))
+
+PDF_MAGIC = b"%PDF-"
+ZIP_MAGIC = b"PK\x03\x04"
+# PDF allows a little junk before the header, so look a bit further in
+SNIFF_BYTES = 1024
+
+UNSUPPORTED_TYPE_DETAIL = "Unsupported file type. Please upload PDF or DOCX files."
+
+
+def format_bytes(size):
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):g} MB"
+    return f"{size / 1024:.0f} KB"
+
+
+def measure_upload(file) -> int:
+    """Returns the size of a seekable file object without reading it."""
+    position = file.tell()
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(position)
+    return size
+
+
+def sniff_file_type(file):
+    """
+    Detects PDF or DOCX from the file's magic bytes.
+    Returns "pdf", "docx" or None, and leaves the file pointer at the start.
+    """
+    file.seek(0)
+    header = file.read(SNIFF_BYTES)
+    file.seek(0)
+
+    if PDF_MAGIC in header:
+        return "pdf"
+    if header.startswith(ZIP_MAGIC):
+        # Only the central directory is read here, not the members
+        try:
+            with zipfile.ZipFile(file) as archive:
+                members = archive.infolist()
+        except zipfile.BadZipFile:
+            return None
+        finally:
+            file.seek(0)
+        names = {member.filename for member in members}
+        if "word/document.xml" not in names:
+            return None
+        if sum(member.file_size for member in members) > MAX_DOCX_UNCOMPRESSED_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail="DOCX file expands beyond the allowed size."
+            )
+        return "docx"
+    return None
+
+
+@timed("ingest")
+def validate_upload(upload: UploadFile, filename=None):
+    """
+    Rejects oversized or unsupported uploads before any parsing happens.
+    Returns the detected file type ("pdf" or "docx").
+    """
+    filename = (filename or upload.filename or "").lower()
+    if filename.endswith(".pdf"):
+        expected = "pdf"
+    elif filename.endswith(".docx"):
+        expected = "docx"
+    else:
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_TYPE_DETAIL)
+
+    size = measure_upload(upload.file)
+    if size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File {upload.filename} exceeds the {format_bytes(MAX_UPLOAD_BYTES)} limit."
+        )
+    if size == 0:
+        raise HTTPException(
+            status_code=400, detail=f"File {upload.filename} is empty.")
+
+    # The content has to agree with the extension
+    if sniff_file_type(upload.file) != expected:
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_TYPE_DETAIL)
+    return expected
+
+
+class RequestSizeLimitMiddleware:
+    """
+    Caps the request body size while it is being received, so oversized
+    uploads are refused before they are spooled by the multipart parser.
+    """
+
+    def __init__(self, app, max_bytes=MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                declared = 0
+            if declared > self.max_bytes:
+                response = JSONResponse(
+                    status_code=413, content={"detail": self._detail()})
+                return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI re-raises HTTPException from body parsing
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _detail(self):
+        return f"Request exceeds the {format_bytes(self.max_bytes)} upload limit."
+
+
+def add_upload_limits(app: FastAPI):
+    app.add_middleware(RequestSizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES)